@@ -0,0 +1,98 @@
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+# Import-time benchmark for KaiPython modules
+#   Each module is imported in a fresh interpreter with -X importtime and the network blocked,
+#   the cumulative import time is checked against a per-module budget and no heavy backend
+#   may be loaded as a side effect of the import.
+#   usage: python -m KaiPython.ImportBenchmark --repeat 5 --out import_times.json
+
+# per-module cumulative import time budget in ms
+BUDGETS_MS = {
+    'KaiPython.Misc':               50,
+    'KaiPython.progress_bar':       50,
+    'KaiPython.RequestsWrapper':    400,    # wraps requests, loading it is the point
+    'KaiPython.M3U8Downloader':     50,
+    'KaiPython.PWBrowser':          100,    # asyncio
+    'KaiPython.SeleniumWrapper':    50,
+    'KaiPython.SubtitleGenerator':  100,    # concurrent.futures, subprocess
+    'KaiPython.SubtitleBenchmark':  150,
+}
+
+# backends that must only load when a class is first used
+HEAVY_MODULES = ('playwright', 'seleniumwire', 'selenium', 'selenium_stealth', 'pydub', 'speech_recognition',
+                 'googletrans', 'joblib', 'tqdm', 'm3u8', 'user_agent')
+
+IMPORT_SNIPPET = '''
+import sys, json, socket
+def _no_network(*args, **kwargs):
+    raise OSError("network access during import")
+socket.socket.connect = socket.create_connection = socket.getaddrinfo = _no_network
+__import__({module!r})   # importlib.import_module would bypass the -X importtime report
+print(json.dumps(sorted(m for m in {heavy!r} if m in sys.modules)))
+'''
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|\s*(\S+)\s*$')
+
+def measure_import( module=str, python=sys.executable )->dict:
+    # One cold import of module in a fresh interpreter
+    result = subprocess.run([python, '-X', 'importtime', '-c', IMPORT_SNIPPET.format(module=module, heavy=HEAVY_MODULES)],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        return {'module': module, 'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed'}
+
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and match.group(3) == module:
+            cumulative_us = int(match.group(2))
+    if cumulative_us is None:
+        return {'module': module, 'error': 'no -X importtime entry, module already imported by the interpreter?'}
+    return {'module': module,
+            'import_ms': round(cumulative_us / 1_000, 2),
+            'heavy_loaded': json.loads(result.stdout.strip().splitlines()[-1])}
+
+def run_benchmark( modules=None, repeat=3, budget_scale=1.0, verbose=False )->list:
+    # Best of repeat cold imports per module, checked against BUDGETS_MS * budget_scale
+    results = []
+    for module in (modules or BUDGETS_MS):
+        runs = [measure_import(module) for _ in range(repeat)]
+        failed = [r for r in runs if 'error' in r]
+        if failed:
+            result = dict(failed[0], ok=False)
+        else:
+            budget_ms = BUDGETS_MS.get(module, 100) * budget_scale
+            import_ms = min(r['import_ms'] for r in runs)
+            heavy_loaded = sorted(set(m for r in runs for m in r['heavy_loaded']))
+            result = {'module': module, 'import_ms': import_ms, 'budget_ms': budget_ms,
+                      'heavy_loaded': heavy_loaded, 'ok': import_ms <= budget_ms and not heavy_loaded}
+        if verbose:
+            status = 'ok' if result['ok'] else 'FAIL'
+            detail = result.get('error') or f"{result['import_ms']}ms / {result['budget_ms']}ms" + \
+                     (f", loaded {result['heavy_loaded']}" if result['heavy_loaded'] else '')
+            print(f"{status: <4} {module: <30} {detail}", file=sys.stderr)
+        results.append(result)
+    return results
+
+def main( argv=None )->None:
+    parser = argparse.ArgumentParser(description='Per-module import time budget check for KaiPython')
+    parser.add_argument('modules', nargs='*', help='modules to check, default: all in BUDGETS_MS')
+    parser.add_argument('--repeat', type=int, default=3, help='cold imports per module, best one is kept')
+    parser.add_argument('--budget-scale', type=float, default=1.0, help='multiply budgets, e.g. for slow CI machines')
+    parser.add_argument('--out', default=None, help='write JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(modules=args.modules, repeat=args.repeat, budget_scale=args.budget_scale, verbose=True)
+    report = {'python': sys.version.split()[0], 'results': results}
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    sys.exit(0 if all(r['ok'] for r in results) else 1)
+
+if __name__ == '__main__':
+    main()
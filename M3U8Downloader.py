@@ -1,21 +1,19 @@
 import os
 import re
 from sys import exit
-import m3u8
-import requests
 from urllib.parse import urlparse
-from user_agent import generate_user_agent
-from joblib import Parallel, delayed
-from tqdm.contrib.concurrent import thread_map
 import concurrent.futures
 import subprocess
 import shutil
+import threading
 import time
 
-from KaiPython.RequestsWrapper import vanilla_download, vanilla_download_with_dict, session_downloads
+# m3u8, requests (KaiPython.RequestsWrapper), user_agent, joblib and tqdm are imported on first use,
+#   so importing this module stays fast
 
 class M3U8Downloader:
     def __init__(self, url=str, referer=str, out_dir=str, out_name='output', skip_fail=False, num_downloaders=4, progress_bar=False, verbose=False) -> None:
+        from user_agent import generate_user_agent
         self.opt_v          = verbose
         self.timer_set      = False
         self.out_dir        = out_dir
@@ -31,6 +29,8 @@ class M3U8Downloader:
         self.num_tasks      = None
         self.num_tasks_left = None
         self.report_freq    = 0.05         # report frequency = every 5%
+        self.mp4_path       = os.path.join(out_dir, out_name+'.mp4')
+        self.segment_callback = None       # segment_callback(idx, ts_path, duration), called in playlist order
         self.__resolve_if_master_playlist()
 
         # Skip the ones failed to be downloaded
@@ -41,6 +41,8 @@ class M3U8Downloader:
         
         
     def __resolve_if_master_playlist(self) -> None:
+        import m3u8
+        import requests
         r = requests.get( url=self.playlist_url, headers=self.header )
 
         if r.ok:
@@ -85,6 +87,8 @@ class M3U8Downloader:
         return rel_path
     
     def __get_ts(self) -> list:
+        import m3u8
+        import requests
         r = requests.get( url=self.playlist_url, headers=self.header )
         ts_hash_list, idx = [], 0    # [(url, dir, file_name)...]
         if r.ok:
@@ -103,7 +107,8 @@ class M3U8Downloader:
                                         {
                                             'url':  ts_dir_url + playlist.uri, 
                                             'dir':  self.tmp_dir,
-                                            'name': f"{idx}.ts"
+                                            'name': f"{idx}.ts",
+                                            'duration': playlist.duration
                                         } 
                                     )
                 else:
@@ -111,12 +116,19 @@ class M3U8Downloader:
                                         {
                                             'url':  playlist.uri,
                                             'dir':  self.tmp_dir, 
-                                            'name': f"{idx}.ts"
+                                            'name': f"{idx}.ts",
+                                            'duration': playlist.duration
                                         } 
                                     ) 
                 idx += 1
             
             if self.opt_v: print(f"Num files to download: {len(ts_hash_list)}")
+
+            # Reset in-order segment notification state
+            self.__segment_lock     = threading.Lock()
+            self.__segment_results  = {}
+            self.__next_segment     = 0
+            self.__segment_durations = [x['duration'] for x in ts_hash_list]
             
             if self.progress_bar:
                 self.__parallel_download_with_progress_bar(ts_hash_list=ts_hash_list)
@@ -129,6 +141,7 @@ class M3U8Downloader:
         return ts_hash_list
         
     def __parallel_session_download(self, ts_hash_list=list, num_jobs=4) -> None:
+        from KaiPython.RequestsWrapper import session_downloads
         self.timer("Para-session download")
 
         # split tasklets evenly for jobs
@@ -146,14 +159,15 @@ class M3U8Downloader:
     # ts_hash_list = [(url, dir, file_name)...]
     def __parallel_download_with_joblib(self, ts_hash_list=list) -> None:
         '''With Joblib'''
+        from joblib import Parallel, delayed
         # fname = re.search(r'\/([^\/\?]+)(\?[^\/]*)?$', url).group(1) 
         self.timer("Para download")
         print(f"Num of downloaders: {self.num_jobs}")
 
         tasks = [ \
                     delayed(self.__vanilla_download_with_progress) \
-                    ( url=x['url'], header=self.header, out_path=os.path.join(x['dir'],x['name']), suppress_fail=self.skip_fail ) \
-                    for x in ts_hash_list \
+                    ( url=x['url'], header=self.header, out_path=os.path.join(x['dir'],x['name']), suppress_fail=self.skip_fail, idx=idx ) \
+                    for idx, x in enumerate(ts_hash_list) \
                 ]
         self.num_tasks = len(tasks)
         self.num_tasks_left = len(tasks)
@@ -178,8 +192,10 @@ class M3U8Downloader:
 
     # Helper_method to provide progress bar like functionality (not refreshing terminal)
     def __vanilla_download_with_progress(self, url=str, header=dict, out_path=os.path or str, 
-                     suppress_fail=False, retry=3, timeout=3):
+                     suppress_fail=False, retry=3, timeout=3, idx=None):
+        from KaiPython.RequestsWrapper import vanilla_download
         rc = vanilla_download(url=url, header=header, out_path=out_path, suppress_fail=suppress_fail)
+        self.__notify_segment(idx=idx, out_path=out_path, rc=rc)
         self.num_tasks_left -= 1
         if (self.num_tasks - self.num_tasks_left) % int(self.num_tasks * self.report_freq) == 0:   # report every 10%
             print("=", end="")
@@ -188,12 +204,13 @@ class M3U8Downloader:
     # ts_hash_list = [(url, dir, file_name)...]
     def __parallel_download_with_progress_bar(self, ts_hash_list=list) -> None:
         '''With tqdm thread_map'''
+        from tqdm.contrib.concurrent import thread_map
         # fname = re.search(r'\/([^\/\?]+)(\?[^\/]*)?$', url).group(1) 
         self.timer("Para download")
         print(f"Number of downloaders: {self.num_jobs}")
 
         kargs_list = [ { 'url':x['url'], 'header':self.header, 'out_path':os.path.join(x['dir'],x['name']), 'suppress_fail':self.skip_fail } for x in ts_hash_list ]
-        skip_list = thread_map(vanilla_download_with_dict, kargs_list)
+        skip_list = thread_map(self.__vanilla_download_with_dict_and_notify, range(len(kargs_list)), kargs_list)
         
         self.skip_set = set( [i for i in skip_list if i is not None] )
         if self.opt_v or self.skip_fail:
@@ -202,6 +219,25 @@ class M3U8Downloader:
 
         self.timer("Para download")
 
+    # Helper_method to notify segment_callback on top of the tqdm thread_map work around
+    def __vanilla_download_with_dict_and_notify(self, idx=int, args_dict=dict):
+        from KaiPython.RequestsWrapper import vanilla_download_with_dict
+        rc = vanilla_download_with_dict(args_dict)
+        self.__notify_segment(idx=idx, out_path=args_dict['out_path'], rc=rc)
+        return rc
+
+    # Downloads finish out of order, hand segments to segment_callback in playlist order
+    #   ts_path is None for a skipped (failed) segment, which is also left out of the final mp4
+    def __notify_segment(self, idx=None, out_path=str, rc=None) -> None:
+        if self.segment_callback is None or idx is None:
+            return
+        with self.__segment_lock:
+            self.__segment_results[idx] = out_path if rc is None else None
+            while self.__next_segment in self.__segment_results:
+                ts_path = self.__segment_results.pop(self.__next_segment)
+                self.segment_callback(self.__next_segment, ts_path, self.__segment_durations[self.__next_segment])
+                self.__next_segment += 1
+
     def __concat_ts(self, ts_paths=list, ts_comb_path=str) -> None:
         self.timer("Concat ts files") 
         
@@ -238,7 +274,9 @@ class M3U8Downloader:
             print(result.stderr)
             exit()
 
-    def download_merge_transcode(self) -> None:
+    def download_merge_transcode(self, segment_callback=None) -> None:
+        # segment_callback(idx, ts_path, duration) lets a consumer work on segments while later ones download
+        self.segment_callback = segment_callback
         if not os.path.exists( self.tmp_dir ):
             os.mkdir( self.tmp_dir )
 
@@ -252,8 +290,7 @@ class M3U8Downloader:
         ts_comb_path = os.path.join( self.tmp_dir, 'combined.ts')
         self.__concat_ts(ts_paths=ts_paths, ts_comb_path=ts_comb_path)
         # Transcode .ts to .mp4
-        mp4_path = os.path.join( self.out_dir, self.out_name+'.mp4' )
-        self.__transcode(ts_comb_path, mp4_path)
+        self.__transcode(ts_comb_path, self.mp4_path)
         # Clean up
         if self.opt_v: print('Cleaning up tmp dir', self.tmp_dir, '...')
         shutil.rmtree(self.tmp_dir)
@@ -1,15 +1,16 @@
 import os
 import time
 from pathlib import Path # Auto Download path lookup
-from googletrans import Translator # Translator for non-english system
 
 def default_download_path():
-    translator = Translator()
     downloads = "Downloads"
     downloads_path = str(Path.home() / downloads)
+    downloads_name = Path(downloads_path).name  # last component on any OS, splitting on "\\" only worked on Windows
 
-    if str(downloads_path.split("\\")[-1]) != downloads:
-        en_path = translator.translate(str(downloads_path.split("\\")[-1]), dest="en")
+    if downloads_name != downloads:
+        from googletrans import Translator # Translator for non-english system, only loaded when needed
+        translator = Translator()
+        en_path = translator.translate(downloads_name, dest="en")
         if en_path.text == "downloads" or en_path.text == "Downloads":
             downloads_path = str(Path.home() / str(en_path.text))
     return downloads_path
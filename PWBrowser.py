@@ -2,17 +2,49 @@ import os
 import re
 from sys import stderr
 import getpass
-from time import sleep
-from user_agent import generate_user_agent
-from playwright.sync_api import sync_playwright
+import asyncio
+
+# playwright and user_agent are imported on first use, so importing this module stays fast
+
+VALID_URL_REGEX = re.compile(
+    r'^(?:http|ftp)s?://' # http:// or https://
+    r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|[A-Z0-9-]{2,}\.?)|' #domain...
+    r'localhost|' #localhost...
+    r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})' # ...or ip
+    r'(?::\d+)?' # optional port
+    r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+
+# resource types worth blocking when only the network traffic matters
+HEAVY_RESOURCES = ("image", "font", "media")
+
+# Traffic filter applied inside the event handlers
+#   keyword: substring of url, regex: pattern searched in url, mime_type: substring(s) of response content-type
+#   returns match(url, content_type=None), content_type None skips the mime check (requests)
+def traffic_filter(keyword=False, regex=None, mime_type=None):
+    pattern = re.compile(regex) if isinstance(regex, str) else regex
+    mime_types = (mime_type,) if isinstance(mime_type, str) else mime_type
+    def match(url=str, content_type=None):
+        if keyword and keyword not in url: return False
+        if pattern and not pattern.search(url): return False
+        if mime_types and content_type is not None:
+            return any(m.lower() in content_type.lower() for m in mime_types)
+        return True
+    return match
+
+def default_chrome_path(chrome_path=str):
+    return chrome_path if isinstance(chrome_path, str) and os.path.exists(chrome_path) \
+        else f"C:\\Users\\{getpass.getuser()}\\AppData\\Local\\Google\\Chrome\\User Data"
 
 # single page browser wrapped on PlayWright
 class PWBrowser:
-    def __init__(self, chrome_path=str, user_agent=generate_user_agent(os=('mac', 'win')), headless=True, verbose=False) -> None:
+    def __init__(self, chrome_path=str, user_agent=None, headless=True, verbose=False) -> None:
+        from playwright.sync_api import sync_playwright
+        if not user_agent:
+            from user_agent import generate_user_agent
+            user_agent = generate_user_agent(os=('mac', 'win'))
         self.verbose = verbose
         if self.verbose: print(f"Launching playwright single page browser wrapper...\nuser_agent: {user_agent}")
-        self.chrome_path= chrome_path if isinstance(chrome_path, str) and os.path.exists(chrome_path) \
-            else f"C:\\Users\\{getpass.getuser()}\\AppData\\Local\\Google\\Chrome\\User Data"
+        self.chrome_path= default_chrome_path(chrome_path)
          # "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
         self.pw         = sync_playwright().start() # playwright enter
         self.browser    = self.pw.chromium.launch_persistent_context(
@@ -35,39 +67,69 @@ class PWBrowser:
     def get_title(self):
         return self.page.title()
 
-    def intercept_network_traffic(self, url=str, keyword=False, sleep_time=3):
+    def intercept_network_traffic(self, url=str, keyword=False, sleep_time=3, regex=None, mime_type=None,
+                                  stop_on_match=False, block_resources=None, timeout=30_000):
+        # keyword/regex/mime_type: only matching traffic is recorded (see traffic_filter)
+        # stop_on_match:   return as soon as the first matching response (e.g. .m3u8) is seen
+        # block_resources: resource types to abort, e.g. HEAVY_RESOURCES, to cut page load time
+        from playwright.sync_api import TimeoutError as PWTimeoutError
         if not self.__check_url_validity(url=url):
             print("Invalid url format.")
             return None
         
         if self.verbose: print("Intercepting network traffic...")
-        request_list, response_list  = [], []
-        self.page.on("request", lambda request: 
-                     request_list.append({
-                         "method": request.method, 
-                         "url": request.url,
-                         "headers": request.all_headers()
-                         }))
-        self.page.on("response", lambda response:
-                     response_list.append({
-                         "status": response.status,
-                         "url": response.url,
-                         "headers": response.all_headers()
-                         }))
-        self.page.goto(url=url, wait_until="networkidle")
-        sleep(sleep_time)
-        print(f"requests: {len(request_list)}, responses: {len(response_list)}")
+        match = traffic_filter(keyword=keyword, regex=regex, mime_type=mime_type)
+        request_list, response_list, recorded = [], [], []
+        capturing = [True]
+        # all_headers() is a round trip that yields to the dispatcher, so the entry is appended first
+        #   and headers still missing when the wait ends are filled in before returning
+        def record(entries, entry, obj):
+            entries.append(entry)
+            recorded.append((entry, obj))
+            entry["headers"] = obj.all_headers()
+        def record_request(request):
+            record(request_list, {"method": request.method, "url": request.url}, request)
+        def record_response(response):
+            record(response_list, {"status": response.status, "url": response.url}, response)
+            if mime_type: record_request(response.request)
+        def on_request(request):
+            # with mime_type, requests are taken from the matched responses instead
+            if capturing[0] and not mime_type and match(request.url): record_request(request)
+        def on_response(response):
+            if capturing[0] and match(response.url, response.headers.get("content-type", "")): record_response(response)
+        def on_route(route):
+            if route.request.resource_type in block_resources: route.abort()
+            else: route.continue_()
 
-        if not keyword: return {"request_list": request_list,
-                                "response_list": response_list}
-        
-        # TODO: Filter traffic on keyword in url
-        if self.verbose: print(f"Filtering requests with keyword \"{keyword}\"...")
+        self.page.on("request", on_request)
+        self.page.on("response", on_response)
+        if block_resources: self.page.route("**/*", on_route)
+        try:
+            if stop_on_match:
+                with self.page.expect_response(lambda r: match(r.url, r.headers.get("content-type", "")), timeout=timeout) as resp_info:
+                    self.page.goto(url=url, wait_until="commit", timeout=timeout)
+                # the response that ended the wait must be in the result
+                matched = resp_info.value
+                if not any(obj is matched or e["url"] == matched.url for e, obj in recorded if "status" in e):
+                    capturing[0] = False
+                    record_response(matched)
+            else:
+                self.page.goto(url=url, wait_until="networkidle", timeout=timeout)
+                self.page.wait_for_timeout(sleep_time * 1_000)  # keeps dispatching events, unlike time.sleep
+        except PWTimeoutError:
+            print(f"Timed out waiting for traffic from {url}", file=stderr)
+        finally:
+            # listeners must not pile up across calls, nor append to lists already returned
+            capturing[0] = False
+            self.page.remove_listener("request", on_request)
+            self.page.remove_listener("response", on_response)
+            if block_resources: self.page.unroute("**/*", on_route)
+        for entry, obj in recorded:
+            if "headers" not in entry: entry["headers"] = obj.all_headers()
+        print(f"requests: {len(request_list)}, responses: {len(response_list)}")
 
-        filtered_request_list = [r for r in request_list if keyword in r["url"]]
-        filtered_response_list = [r for r in response_list if keyword in r["url"]]
-        return {"request_list": filtered_request_list,
-                "response_list": filtered_response_list}
+        return {"request_list": request_list,
+                "response_list": response_list}
         
     def destory(self):
         self.browser.close()
@@ -75,11 +137,176 @@ class PWBrowser:
 
     '''class helper methods'''
     def __check_url_validity(self, url=str):
-        valid_url_regex = re.compile(
-            r'^(?:http|ftp)s?://' # http:// or https://
-            r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|[A-Z0-9-]{2,}\.?)|' #domain...
-            r'localhost|' #localhost...
-            r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})' # ...or ip
-            r'(?::\d+)?' # optional port
-            r'(?:/?|[/?]\S+)$', re.IGNORECASE)
-        return re.match(valid_url_regex, url) is not None   
+        return re.match(VALID_URL_REGEX, url) is not None
+
+
+# multi page browser wrapped on async PlayWright
+#   one persistent context, a bounded pool of pages scanning urls concurrently,
+#   each page is closed and replaced after recycle_after urls to keep browser memory bounded
+class AsyncPWBrowser:
+    def __init__(self, chrome_path=str, user_agent=None, headless=True, max_pages=8, recycle_after=20, verbose=False) -> None:
+        self.verbose        = verbose
+        self.chrome_path    = default_chrome_path(chrome_path)
+        if not user_agent:
+            from user_agent import generate_user_agent
+            user_agent = generate_user_agent(os=('mac', 'win'))
+        self.user_agent     = user_agent
+        self.headless       = headless
+        self.max_pages      = max_pages
+        self.recycle_after  = recycle_after
+        self.pw             = None
+        self.browser        = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.destory()
+
+    async def start(self):
+        from playwright.async_api import async_playwright
+        if self.verbose: print(f"Launching playwright multi page browser wrapper...\nuser_agent: {self.user_agent}")
+        self.pw         = await async_playwright().start() # playwright enter
+        self.browser    = await self.pw.chromium.launch_persistent_context(
+            user_data_dir   = self.chrome_path,
+            user_agent      = self.user_agent,
+            headless        = self.headless,
+            is_mobile       = True,
+            bypass_csp      = True,
+            channel         = "chrome",
+        )
+        if self.verbose: print(f"Launched from {self.chrome_path}")
+
+    async def intercept_network_traffic(self, page, url=str, keyword=False, sleep_time=3, regex=None, mime_type=None,
+                                        stop_on_match=False, block_resources=None, timeout=30_000):
+        # same options and result as PWBrowser.intercept_network_traffic, on the given page of the pool
+        from playwright.async_api import TimeoutError as AsyncPWTimeoutError
+        match = traffic_filter(keyword=keyword, regex=regex, mime_type=mime_type)
+        request_list, response_list, pending_headers = [], [], []
+        async def fill_headers(entry, obj):
+            entry["headers"] = await obj.all_headers()
+        def record(entries, entry, obj):
+            entries.append(entry)
+            pending_headers.append(asyncio.ensure_future(fill_headers(entry, obj)))
+        def record_request(request):
+            record(request_list, {"method": request.method, "url": request.url}, request)
+        def on_request(request):
+            # with mime_type, requests are taken from the matched responses instead
+            if not mime_type and match(request.url): record_request(request)
+        def on_response(response):
+            if not match(response.url, response.headers.get("content-type", "")): return
+            record(response_list, {"status": response.status, "url": response.url}, response)
+            if mime_type: record_request(response.request)
+        async def on_route(route):
+            if route.request.resource_type in block_resources: await route.abort()
+            else: await route.continue_()
+
+        page.on("request", on_request)
+        page.on("response", on_response)
+        if block_resources: await page.route("**/*", on_route)
+        completed = False
+        try:
+            if stop_on_match:
+                async with page.expect_response(lambda r: match(r.url, r.headers.get("content-type", "")), timeout=timeout):
+                    await page.goto(url=url, wait_until="commit", timeout=timeout)
+            else:
+                await page.goto(url=url, wait_until="networkidle", timeout=timeout)
+                await asyncio.sleep(sleep_time)
+            completed = True
+        except AsyncPWTimeoutError:
+            print(f"Timed out waiting for traffic from {url}", file=stderr)
+            completed = True
+        finally:
+            # listeners must not pile up on a reused page
+            page.remove_listener("request", on_request)
+            page.remove_listener("response", on_response)
+            if not completed:
+                # failed page (crash, closed...), do not leave the all_headers() tasks orphaned
+                for task in pending_headers: task.cancel()
+                await asyncio.gather(*pending_headers, return_exceptions=True)
+            if block_resources: await page.unroute("**/*", on_route)
+        await asyncio.gather(*pending_headers, return_exceptions=True)
+        if self.verbose: print(f"{url}\n  requests: {len(request_list)}, responses: {len(response_list)}")
+
+        return {"request_list": request_list,
+                "response_list": response_list}
+
+    async def intercept_many(self, urls=list, **intercept_kwargs):
+        # async generator, yields (url, result) as each url completes (not in input order)
+        #   intercept_kwargs are passed to intercept_network_traffic (keyword, mime_type, stop_on_match...)
+        #   result is the intercept_network_traffic dict, or {"error": str} on failure
+        url_queue, result_queue = asyncio.Queue(), asyncio.Queue()
+        for url in urls:
+            url_queue.put_nowait(url)
+        num_workers = min(self.max_pages, url_queue.qsize())
+
+        async def close_page(page):
+            try:
+                await page.close()
+            except Exception:
+                pass    # page or context already gone
+
+        async def worker():
+            # every url taken off the queue yields exactly one result, failures included
+            page, page_uses = None, 0
+            try:
+                while True:
+                    try:
+                        url = url_queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    if re.match(VALID_URL_REGEX, url) is None:
+                        await result_queue.put((url, {"error": "Invalid url format."}))
+                        continue
+                    try:
+                        # (re)open the page, recycling releases whatever the previous sites left behind
+                        if page is None or page_uses >= self.recycle_after:
+                            if page is not None: await close_page(page)
+                            page, page_uses = None, 0
+                            page = await self.browser.new_page()
+                        page_uses += 1
+                        result = await self.intercept_network_traffic(page, url=url, **intercept_kwargs)
+                    except Exception as e:
+                        result = {"error": str(e)}
+                        # the page may have crashed or been closed, the next url gets a fresh one
+                        if page is not None: await close_page(page)
+                        page, page_uses = None, 0
+                    await result_queue.put((url, result))
+            finally:
+                try:
+                    if page is not None: await close_page(page)
+                finally:
+                    result_queue.put_nowait(None)   # worker done, must always be posted
+
+        tasks = [asyncio.create_task(worker()) for _ in range(num_workers)]
+        try:
+            workers_left = num_workers
+            while workers_left:
+                item = await result_queue.get()
+                if item is None:
+                    workers_left -= 1
+                else:
+                    yield item
+        finally:
+            for task in tasks: task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def destory(self):
+        if self.browser: await self.browser.close()
+        if self.pw: await self.pw.stop()
+        self.browser, self.pw = None, None
+
+# Blocking helper around AsyncPWBrowser.intercept_many, returns [(url, result)] in completion order
+#   (a list, so duplicate urls in the input each keep their own result)
+#   on_result(url, result) is called as each url completes
+#   browser_kwargs go to AsyncPWBrowser, intercept_kwargs to intercept_network_traffic
+def intercept_network_traffic_many(urls=list, on_result=None, browser_kwargs=None, **intercept_kwargs):
+    async def run():
+        results = []
+        async with AsyncPWBrowser(**(browser_kwargs or {})) as browser:
+            async for url, result in browser.intercept_many(urls, **intercept_kwargs):
+                results.append((url, result))
+                if on_result: on_result(url, result)
+        return results
+    return asyncio.run(run())
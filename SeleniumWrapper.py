@@ -1,20 +1,68 @@
-from seleniumwire.utils import decode as sw_decode
-from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
-from seleniumwire import webdriver
-from selenium.webdriver.remote.webelement import WebElement
-from selenium.webdriver.common.by import By
-from selenium_stealth import stealth
-
-from user_agent import generate_user_agent 
-
 import time
 import re
 import sys
 import logging
+import uuid
+from collections.abc import Mapping
+
+# selenium, seleniumwire, selenium_stealth and user_agent are imported on first use,
+#   so importing this module stays fast
+
+# One round trip for get_clickables: evaluate the XPath in the page, collect visibility,
+#   enabled state and attributes, and tag each clickable with data-kai-clickable=<scan_id>-<my_id>
+#   so its WebElement can be looked up later only when needed (tags of the previous scan are cleared)
+COLLECT_CLICKABLES_JS = '''
+var old = document.querySelectorAll('[data-kai-clickable]');
+for (var i = 0; i < old.length; i++) old[i].removeAttribute('data-kai-clickable');
+var snap = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+var out = [];
+for (var i = 0; i < snap.snapshotLength; i++) {
+    var el = snap.snapshotItem(i);
+    if (el.nodeType !== 1) continue;
+    var style = window.getComputedStyle(el);
+    var displayed = style.display !== 'none' && style.visibility !== 'hidden'
+        && parseFloat(style.opacity) > 0 && el.getClientRects().length > 0;
+    if (!displayed || el.disabled) continue;
+    el.setAttribute('data-kai-clickable', arguments[1] + '-' + out.length);
+    out.push({tag: el.tagName.toLowerCase(), 'class': el.getAttribute('class'),
+              id: el.getAttribute('id'), text: (el.innerText || '').trim()});
+}
+return [snap.snapshotLength, out];
+'''
+
+# {my_id: WebElement} resolved lazily from the data-kai-clickable tag set by COLLECT_CLICKABLES_JS
+#   scan_id ties the mapping to its own get_clickables call: after a newer scan (or a page change)
+#   the lookup raises KeyError instead of resolving to a different element
+class LazyClickElements(Mapping):
+    def __init__( self, driver, scan_id=str, num_clickables=int )->None:
+        self.driver         = driver
+        self.scan_id        = scan_id
+        self.num_clickables = num_clickables
+
+    def __getitem__( self, my_id=int ):
+        if not isinstance(my_id, int) or not 0 <= my_id < self.num_clickables: raise KeyError(my_id)
+        # execute_script returns at once, find_element would sit out the implicit wait on a stale tag
+        element = self.driver.execute_script("return document.querySelector(arguments[0]);",
+                                             f'[data-kai-clickable="{self.scan_id}-{my_id}"]')
+        if element is None: raise KeyError(my_id)
+        return element
+
+    def __iter__( self ):
+        return iter(range(self.num_clickables))
+
+    def __len__( self )->int:
+        return self.num_clickables
 
 # Selenium wrapper class
 class SeleniumWrapper:
-    def __init__( self, headless=True, verbose=False )->None:
+    def __init__( self, headless=True, verbose=False, request_storage_max_size=None )->None:
+        # request_storage_max_size: keep at most this many captured requests (in memory, oldest dropped),
+        #   keeps memory flat over long crawling sessions; None stores everything on disk (seleniumwire default)
+        from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
+        from seleniumwire import webdriver
+        from selenium_stealth import stealth
+        from user_agent import generate_user_agent
+
         # Set option
         self.verbose=verbose
         # log on verbose
@@ -44,7 +92,14 @@ class SeleniumWrapper:
         print('- UserAgent:', user_agent)
 
         # Start chrome webdriver
-        self.driver = webdriver.Chrome(options=options)
+        seleniumwire_options = {}
+        if request_storage_max_size:
+            seleniumwire_options = {'request_storage': 'memory',
+                                    'request_storage_max_size': request_storage_max_size}
+        self.driver = webdriver.Chrome(options=options, seleniumwire_options=seleniumwire_options)
+
+        # ids of requests already returned by an incremental scan
+        self.__scanned_ids = set()
 
         # Max window to get all elements
         #self.driver.maximize_window()
@@ -80,68 +135,129 @@ class SeleniumWrapper:
     def clean_network_traffic( self )->None:
         # clean out captured requests
         del self.driver.requests
+        self.__scanned_ids.clear()
+
+    def set_capture_scope( self, url_patterns=None )->None:
+        # only capture requests whose url matches one of the regex url_patterns, None captures everything
+        #   out-of-scope requests are passed through by seleniumwire and never stored
+        self.driver.scopes = list(url_patterns) if url_patterns else []
+
+    def scan_network_traffic( self, **filters )->list:
+        # all captured traffic as a list, see iter_network_traffic for filters
+        return list(self.iter_network_traffic(**filters))
 
-    def scan_network_traffic( self )->list:
+    def iter_network_traffic( self, url_pattern=None, content_types=None, 
+                              max_body_size=None, since_last_scan=False ):
+        # Lazily yield captured traffic, bodies are decoded only for requests passing the filters
+        #   url_pattern:     regex searched in the url
+        #   content_types:   substring(s) of the response Content-Type, e.g. ('mpegurl', 'json')
+        #   max_body_size:   bodies larger than this many (encoded) bytes are not decoded,
+        #                    judged from Content-Length when the response has one
+        #   since_last_scan: skip requests already returned by a previous incremental scan,
+        #                    combine with request_storage_max_size so the scan itself stays bounded
+        pattern = re.compile(url_pattern) if isinstance(url_pattern, str) else url_pattern
+        if isinstance(content_types, str): content_types = (content_types,)
 
-        res = []
-        # scan traffic
-        for request in self.driver.requests:
+        stored_ids = set()
+        for request in self.driver.iter_requests():
             url_received = request.url
+            stored_ids.add(request.id)
+            if request.response is None: continue           # still in flight, pick it up next scan
+            if since_last_scan and request.id in self.__scanned_ids: continue
+            if pattern and not pattern.search(url_received): continue
+            if content_types:
+                content_type = request.response.headers.get('Content-Type', '').lower()
+                if not any(t.lower() in content_type for t in content_types): continue
+            if since_last_scan: self.__scanned_ids.add(request.id)
+
             try:
-                body = sw_decode(request.response.body, 
-                                request.response.headers.get('Content-Encoding', 'identity'))
-                try:
-                    body = body.decode("utf-8", errors='fatal') #, errors='replace')
-                except:
-                    try:
-                        body = body.decode("unicode-escape", errors='fatal')
-                    except:    
-                        body = '### Decode Failed ###'
+                if max_body_size is not None and self.__body_size(request) > max_body_size:
+                    body = '### Body Too Large ###'
+                else:
+                    body = self.__decode_body(request)
                 
                 # Try to find the correct referer
                 this_referer = ''
                 if request.headers.get("referer"):
                     this_referer = request.headers.get("referer") 
                 
-                # append to res
-                res.append({
+                yield {
                     'url': url_received,
                     'header': request.headers.as_string(),
                     'body': body,
                     'referer': this_referer,
-                })
+                }
             except:
                 print('= Warn: error parsing network traffic from:', 
                 url_received[:50]+'...', file=sys.stderr)
-        
-        return res
+
+        # full pass done: forget ids of requests dropped from storage, so the set stays bounded by it
+        if since_last_scan: self.__scanned_ids &= stored_ids
+
+    def __body_size( self, request )->int:
+        # Content-Length when present, so oversized bodies are skipped without touching .body
+        content_length = request.response.headers.get('Content-Length')
+        if content_length and content_length.strip().isdigit():
+            return int(content_length)
+        return len(request.response.body)
+
+    def __decode_body( self, request )->str:
+        from seleniumwire.utils import decode as sw_decode
+        body = sw_decode(request.response.body, 
+                        request.response.headers.get('Content-Encoding', 'identity'))
+        try:
+            body = body.decode("utf-8", errors='fatal') #, errors='replace')
+        except:
+            try:
+                body = body.decode("unicode-escape", errors='fatal')
+            except:    
+                body = '### Decode Failed ###'
+        return body
     
     def am_i_blocked_by_cloudflare( self )->bool:
+        from selenium.webdriver.common.by import By
         # cloudflare support only
         cloudflare = "//iframe[contains(@src, 'cloudflare')]"
         elements = self.driver.find_elements(By.XPATH, cloudflare)
         return True if len(elements) > 0 else False
        
-    def get_clickables( self, search_suggestion=None )->(list, list):
-        # return ([clickable obj], [WebElement])
+    def get_clickables( self, search_suggestion=None, batched=True )->(list, dict):
+        # return ([clickable obj], {my_id: WebElement})
+        #   batched: collect everything in one execute_script, WebElements are looked up on access,
+        #            otherwise query every element through WebDriver (several round trips each)
 
         # blocked?
-        if self.am_i_blocked():
+        if self.am_i_blocked_by_cloudflare():
             print('! Terminated: Request blocked by cloudflare')
             sys.exit(1)
 
-        # search elements
-        elements = None # XPATH syntax //tag[@attr="player"]/div/span[2]
+        # search pattern, XPATH syntax //tag[@attr="player"]/div/span[2]
         if not search_suggestion:
-            elements = self.driver.find_elements(By.XPATH, '//*class') # get all el by xpath *
-        else:
-            try:    # get by partial class
-                search_pattern = "//*[contains(@class, '" + search_suggestion + "')]"
-                print('- XPATH search pattern:', search_pattern)
-                elements = self.driver.find_elements(By.XPATH, search_pattern)
+            search_pattern = '//*[@class]' # get all el with class attr
+        else:   # get by partial class
+            search_pattern = "//*[contains(@class, '" + search_suggestion + "')]"
+            print('- XPATH search pattern:', search_pattern)
+
+        if batched:
+            try:
+                scan_id = uuid.uuid4().hex[:8]
+                num_elements, clickables = self.driver.execute_script(COLLECT_CLICKABLES_JS, search_pattern, scan_id)
             except Exception as e:
-                print("Error finding element: " + e)
+                print("Error finding element: " + str(e))
                 sys.exit(1)
+            print('# found elements num:', num_elements)
+            for my_id, clickable in enumerate(clickables):
+                clickable['my_id'] = my_id
+            print('# found clickables num:', len(clickables))
+            return (clickables, LazyClickElements(self.driver, scan_id, len(clickables)))
+
+        # search elements
+        from selenium.webdriver.common.by import By
+        try:
+            elements = self.driver.find_elements(By.XPATH, search_pattern)
+        except Exception as e:
+            print("Error finding element: " + str(e))
+            sys.exit(1)
 
         # collect elements info
         clickables, click_elements = [], {}
@@ -163,7 +279,7 @@ class SeleniumWrapper:
         print('# found clickables num:', len(clickables))
         return (clickables, click_elements)
 
-    def click( self, element=WebElement, load_time=2 )->None:
+    def click( self, element=None, load_time=2 )->None:    # element: WebElement
         # print("click", element.tag_name, 'at', element.location)
         self.driver.execute_script("arguments[0].scrollIntoView();", element)
         self.driver.execute_script("arguments[0].click();", element)
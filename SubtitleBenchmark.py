@@ -0,0 +1,154 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import multiprocessing
+from types import SimpleNamespace
+
+# KaiPython needs to be added if not in site-packages
+    # import sys
+    # sys.path.insert(0, r'path_to_KayPython')
+from KaiPython.SubtitleGenerator import SubtitleGenerator
+
+# Offline benchmark for SubtitleGenerator
+#   Synthetic audio is fed through serial and parallel modes with stubbed recognizer/translator,
+#   so the numbers reflect the local pipeline (decode, slice, export, recognize, translate, write) only.
+#   usage: python -m KaiPython.SubtitleBenchmark --durations 60 300 --jobs 2 4 8 --out bench.json
+
+PATTERNS = ('tone', 'noise', 'silence', 'mixed')
+
+class StubRecognizer:
+    # Offline stand-in for recognize_google, latency simulates the network round trip
+    #   record() is the real speech_recognition one, so reading the chunk wav is still measured
+    def __init__( self, latency=0.0 )->None:
+        import speech_recognition as sr
+        self.__recognizer = sr.Recognizer()
+        self.latency = latency
+
+    def record( self, source, **kwargs ):
+        return self.__recognizer.record(source, **kwargs)
+
+    def recognize_google( self, audio_data, language=None, **kwargs )->str:
+        import speech_recognition as sr
+        if self.latency: time.sleep(self.latency)
+        if not any(audio_data.frame_data):
+            raise sr.UnknownValueError()    # all-zero samples, same as silence in the real service
+        return f'stub transcript {len(audio_data.frame_data)}'
+
+class StubTranslator:
+    # Offline stand-in for googletrans.Translator
+    def __init__( self, latency=0.0 )->None:
+        self.latency = latency
+
+    def translate( self, text=str, dest='en' ):
+        if self.latency: time.sleep(self.latency)
+        return SimpleNamespace(text=f'[{dest}] {text}')
+
+def synthetic_audio( pattern='tone', duration=60, sample_rate=16_000 ):
+    # Build a mono test clip of duration seconds from 1 second tiles
+    #   tone: 440Hz sine, noise: white noise, silence: digital silence,
+    #   mixed: repeating 2s tone / 1s silence / 1s noise, so some chunks are silent
+    from pydub import AudioSegment
+    from pydub.generators import Sine, WhiteNoise
+    tone    = Sine(440, sample_rate=sample_rate).to_audio_segment(duration=1_000, volume=-20)
+    noise   = WhiteNoise(sample_rate=sample_rate).to_audio_segment(duration=1_000, volume=-30)
+    silence = AudioSegment.silent(duration=1_000, frame_rate=sample_rate)
+    if pattern == 'tone':
+        tile = tone
+    elif pattern == 'noise':
+        tile = noise
+    elif pattern == 'silence':
+        tile = silence
+    elif pattern == 'mixed':
+        tile = tone + tone + silence + noise
+    else:
+        raise ValueError(f"Unknown pattern '{pattern}', expected one of {PATTERNS}")
+    repeat = -(-duration * 1_000 // len(tile))      # ceil
+    return (tile * repeat)[:duration * 1_000].set_channels(1)
+
+def peak_rss_mb():
+    # Peak resident set size of this process in MB, None where resource is unavailable (Windows)
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 2)  # bytes on macOS, KB on Linux
+
+def run_case( case=dict )->dict:
+    # One benchmark run, executed in a fresh process so peak RSS is per case
+    work_dir = tempfile.mkdtemp(prefix='subtitle_bench_')
+    try:
+        src_file_path = os.path.join(work_dir, f"{case['pattern']}_{case['duration']}s.wav")
+        synthetic_audio(case['pattern'], case['duration'], case['sample_rate']).export(src_file_path, format='wav')
+
+        generator = SubtitleGenerator(chunk_size=case['chunk_size'],
+                                      parallel=case['num_jobs'] is not None,
+                                      num_jobs=case['num_jobs'] or 1,
+                                      recognizer=StubRecognizer(case['latency']),
+                                      translator=StubTranslator(case['latency']))
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            generator.generate_subtitle(src_file_path=src_file_path, out_dir=work_dir, in_lang='en', out_lang='en')
+        wall_time = time.perf_counter() - start
+
+        return dict(case,
+                    mode='parallel' if case['num_jobs'] else 'serial',
+                    num_chunks=generator.num_chunks,
+                    wall_time=round(wall_time, 4),
+                    chunks_per_sec=round(generator.num_chunks / wall_time, 2),
+                    stage_times={k: round(v, 4) for k, v in generator.stage_times.items()},
+                    peak_rss_mb=peak_rss_mb())
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def run_benchmark( patterns=('tone',), durations=(60,), jobs=(2, 4), chunk_size=3,
+                   sample_rate=16_000, latency=0.0, verbose=False )->list:
+    # Serial run (num_jobs=None) plus one parallel run per num_jobs, for every pattern x duration
+    cases = [ {'pattern': p, 'duration': d, 'num_jobs': j, 'chunk_size': chunk_size,
+               'sample_rate': sample_rate, 'latency': latency}
+              for p in patterns for d in durations for j in (None, *jobs) ]
+    results = []
+    ctx = multiprocessing.get_context('spawn')
+    for case in cases:
+        with ctx.Pool(1) as pool:
+            result = pool.apply(run_case, (case,))
+        if verbose:
+            print(f"{result['pattern']: <8} {result['duration']: >5}s {result['mode']: <8} jobs={result['num_jobs']}: "
+                  f"{result['chunks_per_sec']} chunks/s, {result['wall_time']}s, peak {result['peak_rss_mb']}MB", file=sys.stderr)
+        results.append(result)
+
+    # Scaling against the serial baseline of the same pattern x duration
+    serial = { (r['pattern'], r['duration']): r['wall_time'] for r in results if r['mode'] == 'serial' }
+    for r in results:
+        r['speedup'] = round(serial[(r['pattern'], r['duration'])] / r['wall_time'], 2)
+    return results
+
+def main( argv=None )->None:
+    parser = argparse.ArgumentParser(description='Offline SubtitleGenerator benchmark with synthetic audio')
+    parser.add_argument('--patterns', nargs='+', default=['tone', 'mixed'], choices=PATTERNS)
+    parser.add_argument('--durations', nargs='+', type=int, default=[60], help='audio length in seconds')
+    parser.add_argument('--jobs', nargs='+', type=int, default=[2, 4], help='num_jobs for the parallel runs')
+    parser.add_argument('--chunk-size', type=int, default=3)
+    parser.add_argument('--sample-rate', type=int, default=16_000)
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated recognizer/translator latency in seconds')
+    parser.add_argument('--out', default=None, help='write JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(patterns=args.patterns, durations=args.durations, jobs=args.jobs,
+                            chunk_size=args.chunk_size, sample_rate=args.sample_rate,
+                            latency=args.latency, verbose=True)
+    report = {'python': sys.version.split()[0], 'cpu_count': os.cpu_count(), 'results': results}
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,24 @@
 import os
+import re
 from sys import stderr
-from pydub import AudioSegment          # for audio extraction from video file
-import speech_recognition as sr         # from Google
-from googletrans import Translator      # from Google, version can cause issue: pip install googletrans==3.1.0a0
 import shutil                           # for cleanup
-from joblib import Parallel, delayed    # for parallel execution
 import time                             # performance analysis
 import subprocess
+import queue                            # segment hand-off for the m3u8 pipeline
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # KaiPython needs to be added if not in site-packages
     # import sys
     # sys.path.insert(0, r'path_to_KayPython')
 from KaiPython.Misc import get_file_barename, default_download_path
 
+# Heavy backends are imported on first use, so importing this module stays fast and offline
+#   pydub.AudioSegment:  audio extraction from video file
+#   speech_recognition:  from Google
+#   googletrans:         from Google, version can cause issue: pip install googletrans==3.1.0a0
+#   joblib:              parallel execution
+
 # Helper function to parallel a class method (this is genius)
 #   credit to Qingkai Kong: http://qingkaikong.blogspot.com/2016/12/python-parallel-method-in-class.html
 def process_chunk_wrapper( arg, **kwarg ):
@@ -21,25 +27,40 @@ def process_chunk_wrapper( arg, **kwarg ):
 # SubtitleGenerator class
 #   The class generates subtitle using fixed time interval, which might not be the best idea
 class SubtitleGenerator:
-    def __init__( self, chunk_size=3, verbose=False, parallel=False, num_jobs=-1 )->None:
-        # speech recognition obj init
-        self.__recognizer   = sr.Recognizer()
-        self.__translator   = Translator()
+    def __init__( self, chunk_size=3, verbose=False, parallel=False, num_jobs=-1,
+                  recognizer=None, translator=None )->None:
+        # speech recognition obj init, recognizer/translator can be swapped (e.g. offline stubs for benchmarking)
+        if not recognizer:
+            import speech_recognition as sr
+            recognizer = sr.Recognizer()
+        if not translator:
+            from googletrans import Translator
+            translator = Translator()
+        self.__recognizer   = recognizer
+        self.__translator   = translator
         self.parallel       = parallel
         self.num_jobs       = num_jobs
         self.barename       = 'TBD'         # to-be-decided
         self.chunk_size     = chunk_size    # in seconds
         self.opt_v          = verbose
+        self.stage_times    = {}            # accumulated seconds per stage, summed over threads
+        self.__stage_lock   = threading.Lock()
     
-    def generate_subtitle(self, src_file_path=str or os.path, out_dir=default_download_path(), 
+    def generate_subtitle(self, src_file_path=str or os.path, out_dir=None, 
                           in_lang=str, out_lang='en',
-                          embed=False)->None:
-        # Set the in_lang, out_lang, out_dir
-        self.out_dir  = out_dir
+                          embed=False, soft_embed=False)->None:
+        from pydub import AudioSegment
+        from joblib import Parallel, delayed
+
+        # Set the in_lang, out_lang, out_dir (default: Downloads, looked up per call not at import)
+        self.out_dir  = out_dir if out_dir else default_download_path()
         self.in_lang  = in_lang
         self.out_lang = out_lang
         self.barename = get_file_barename(src_file_path)
         self.embed    = embed
+        self.soft_embed = soft_embed    # mux as a subtitle track instead of burning in
+
+        self.stage_times = {}
 
         # Create a directory to store chunked audio files
         self.chunk_dir = os.path.join( self.out_dir, 'audio_chunks_'+str(time.time()).replace('.',''))
@@ -47,7 +68,9 @@ class SubtitleGenerator:
             os.mkdir( self.chunk_dir )
 
         # Extract audio from video
+        stage_start = time.perf_counter()
         self.audio_clip = AudioSegment.from_file( src_file_path )
+        self.__record_stage('decode', stage_start)
 
         # Split the audio into chunks and transcribe
         self.total_duration = len(self.audio_clip) // 1_000             # in seconds
@@ -78,7 +101,9 @@ class SubtitleGenerator:
         print("--- %s seconds ---" % (time.time() - performance_start_time))
 
         # Write .srt subtitle file after translation iteration ends
+        stage_start = time.perf_counter()
         out_path = self.__write_to_file(subtitle_lines=self.subtitle_lines)
+        self.__record_stage('write', stage_start)
 
         # Clean up temporary audio files
         if self.opt_v: print('Cleaning up tmp dir', self.chunk_dir, '...')
@@ -86,16 +111,44 @@ class SubtitleGenerator:
 
         # Embed to video
         if self.embed:
-            self.embed_to_video(src_file_path=src_file_path, out_path=out_path)
+            self.embed_to_video(src_file_path=src_file_path, out_path=out_path, soft=self.soft_embed)
 
-    def embed_to_video( self, src_file_path=str or os.path, out_path=str or os.path ) -> None:
+    def embed_to_video( self, src_file_path=str or os.path, out_path=str or os.path or list, 
+                        soft=False, languages=None ) -> None:
+        # out_path: one .srt path, or a list of .srt paths to embed in one pass
+        # soft:     mux the subtitles as tracks with stream copy (no re-encode),
+        #           mov_text for .mp4/.mov/.m4v, srt for .mkv; otherwise burn in with re-encode
+        # languages: optional list of ISO 639-2 codes (e.g. 'eng') tagged on the soft tracks
+        srt_paths = [out_path] if isinstance(out_path, (str, os.PathLike)) else list(out_path)
         orig_name = os.path.basename(src_file_path)
         split_name_list = str(orig_name).split('.')
         split_name_list.insert(-1,'subtitled')
         new_name  = '.'.join(split_name_list)
         new_path  = os.path.join(self.out_dir, new_name)
-        command = f'ffmpeg -i {src_file_path} -vf \"subtitles={out_path}\" {new_path}'
-        result = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+        if soft:
+            ext = os.path.splitext(new_path)[1].lower()
+            if ext in ('.mp4', '.mov', '.m4v'):
+                sub_codec = 'mov_text'
+            elif ext == '.mkv':
+                sub_codec = 'srt'
+            else:
+                raise ValueError(f"Soft subtitle muxing not supported for '{ext}' container, use .mp4 or .mkv")
+            command = ['ffmpeg', '-n', '-i', str(src_file_path)]
+            for srt_path in srt_paths:
+                command += ['-i', str(srt_path)]
+            command += ['-map', '0:v?', '-map', '0:a?']
+            for i in range(len(srt_paths)):
+                command += ['-map', f'{i + 1}:0']
+            command += ['-c', 'copy', '-c:s', sub_codec]
+            for i, lang in enumerate(languages or []):
+                command += [f'-metadata:s:s:{i}', f'language={lang}']
+            command += [str(new_path)]
+        else:
+            subtitle_filter = ','.join( 'subtitles=' + self.__escape_filter_path(p) for p in srt_paths )
+            command = ['ffmpeg', '-n', '-i', str(src_file_path), '-vf', subtitle_filter, str(new_path)]
+
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
 
         if result.returncode == 0:
             if self.opt_v: print("Subtitle embedding complete.")
@@ -105,14 +158,148 @@ class SubtitleGenerator:
             print(result.stderr)
             exit()
 
+    @staticmethod
+    def __escape_filter_path( path=str ) -> str:
+        # ffmpeg filtergraph escaping: option value level (':' and "'"), then graph level ('\\' ',' ';' '[' ']')
+        path = str(path).replace('\\', '/')
+        path = re.sub(r"([:'])", r"\\\1", path)
+        return re.sub(r"([\\,;\[\]'])", r"\\\1", path)
+
+    def generate_subtitle_from_m3u8(self, downloader, in_lang=str, out_lang='en', embed=False, soft_embed=False)->None:
+        # Transcribe while downloading: downloader is a KaiPython.M3U8Downloader,
+        #   each downloaded .ts segment is decoded and fed into a rolling audio window,
+        #   full chunks are transcribed while later segments are still downloading.
+        #   The .srt is named after the downloader output so it sits next to the .mp4
+        from pydub import AudioSegment
+
+        self.out_dir  = downloader.out_dir
+        self.in_lang  = in_lang
+        self.out_lang = out_lang
+        self.barename = downloader.out_name
+        self.embed    = embed
+        self.soft_embed = soft_embed    # mux as a subtitle track instead of burning in
+
+        self.stage_times = {}
+
+        # Create a directory to store chunked audio files
+        self.chunk_dir = os.path.join( self.out_dir, 'audio_chunks_'+str(time.time()).replace('.',''))
+        if not os.path.exists( self.chunk_dir ):
+            os.mkdir( self.chunk_dir )
+
+        self.num_chunks = '?'       # unknown until the last segment arrives
+        self.subtitle_lines = []
+
+        # Performance Analysis
+        performance_start_time = time.time()
+
+        # Run the download in background, segments come back in playlist order through the queue
+        segment_queue, download_error, stop_download = queue.Queue(), [], threading.Event()
+        def on_segment(idx, ts_path, duration):
+            # raising here aborts the download once the consumer side has failed
+            if stop_download.is_set(): raise RuntimeError("Subtitle pipeline aborted, stopping download")
+            segment_queue.put((idx, ts_path, duration))
+        def download_worker():
+            try:
+                downloader.download_merge_transcode(segment_callback=on_segment)
+            except BaseException as e:      # sys.exit() in the downloader must not hang the consumer
+                download_error.append(e)
+            finally:
+                segment_queue.put(None)
+        download_thread = threading.Thread(target=download_worker, daemon=True)
+        download_thread.start()
+
+        # Parallel | Serial
+        executor = None
+        if self.parallel:
+            num_workers = os.cpu_count() if self.num_jobs == -1 else self.num_jobs
+            if self.opt_v: print("Parallel mode: multi-threading =", num_workers)
+            executor = ThreadPoolExecutor(max_workers=num_workers)
+        futures = []
+        def submit_chunk(idx, chunk_audio, start_time, end_time):
+            if executor:
+                # surface a failed chunk now rather than after the whole stream has downloaded
+                for future in futures:
+                    if future.done(): future.result()
+                futures.append(executor.submit(self.__process_chunk_audio, idx, chunk_audio, start_time, end_time))
+            else:
+                self.__process_chunk_audio(idx, chunk_audio, start_time, end_time)
+
+        # Any failure (download, decode, transcription) shuts the workers down and removes chunk_dir
+        try:
+            # Rolling window: window holds the not-yet-transcribed audio starting at window_start (ms)
+            window, window_start, idx = AudioSegment.empty(), 0, 0
+            chunk_ms = self.chunk_size * 1_000
+            while True:
+                item = segment_queue.get()
+                if item is None: break
+                _, ts_path, duration = item
+                if ts_path is None: continue    # skipped download, not part of the mp4 either
+                try:
+                    stage_start = time.perf_counter()
+                    window += AudioSegment.from_file( ts_path )
+                    self.__record_stage('decode', stage_start)
+                except Exception as e:
+                    # segment without decodable audio, keep the timeline aligned with the video
+                    print(f"@ Unable to decode audio from {ts_path}, padding silence; {e}", file=stderr)
+                    window += AudioSegment.silent( duration=int(duration * 1_000) )
+                # Transcribe every full chunk in the window
+                while len(window) >= chunk_ms:
+                    stage_start = time.perf_counter()
+                    chunk_audio, window = window[:chunk_ms], window[chunk_ms:]
+                    self.__record_stage('slice', stage_start)
+                    submit_chunk(idx, chunk_audio, idx * self.chunk_size, (idx + 1) * self.chunk_size)
+                    window_start, idx = window_start + chunk_ms, idx + 1
+
+            download_thread.join()
+            if download_error: raise download_error[0]
+
+            # Last partial chunk
+            self.total_duration = (window_start + len(window)) // 1_000    # in seconds
+            if self.total_duration > idx * self.chunk_size:
+                submit_chunk(idx, window, idx * self.chunk_size, self.total_duration)
+                idx += 1
+            self.num_chunks = idx
+            if executor:
+                for future in futures: future.result()
+                executor.shutdown()
+                # Sort (Parallel jobs does not append in order
+                self.subtitle_lines = sorted( self.subtitle_lines, key=lambda x: x['index'] )
+        except BaseException:
+            stop_download.set()
+            if executor: executor.shutdown(wait=True, cancel_futures=True)
+            shutil.rmtree(self.chunk_dir, ignore_errors=True)
+            raise
+
+        # Performance Analysis
+        print("--- %s seconds ---" % (time.time() - performance_start_time))
+
+        # Write .srt subtitle file
+        stage_start = time.perf_counter()
+        out_path = self.__write_to_file(subtitle_lines=self.subtitle_lines)
+        self.__record_stage('write', stage_start)
+
+        # Clean up temporary audio files
+        if self.opt_v: print('Cleaning up tmp dir', self.chunk_dir, '...')
+        shutil.rmtree(self.chunk_dir)
+
+        # Embed to video
+        if self.embed:
+            self.embed_to_video(src_file_path=downloader.mp4_path, out_path=out_path, soft=self.soft_embed)
+
     def process_chunk( self, idx=int )->None:   # had to make this public b/c of the parallel wrapper func
         start_time  = idx * self.chunk_size
         end_time    = min((idx + 1) * self.chunk_size, self.total_duration)
+        stage_start = time.perf_counter()
         chunk_audio = self.audio_clip[ start_time * 1_000 : end_time * 1_000 ]  # pydub use unit in milsec
+        self.__record_stage('slice', stage_start)
+        self.__process_chunk_audio( idx, chunk_audio, start_time, end_time )
 
+    def __process_chunk_audio( self, idx=int, chunk_audio=None, start_time=int, end_time=int )->None:
         # Save the chunked audio as a temporary WAV file
         temp_audio_file = os.path.join( self.chunk_dir, f'chunk_{idx}.wav' )
+        stage_start = time.perf_counter()
         chunk_audio.export(temp_audio_file, format='wav')
+        self.__record_stage('export', stage_start)
 
         # Translate
         transcript, translated = self.__translate( audio_data_file=temp_audio_file )
@@ -131,17 +318,24 @@ class SubtitleGenerator:
         })
 
     def __translate( self, audio_data_file=str, retry=3 )->str:
+        import speech_recognition as sr
         # Perform speech recognition
         for _ in range(retry):
             try:
                 # Load the temporary audio file and transcribe it
-                with sr.AudioFile(audio_data_file) as source:
-                    audio_data = self.__recognizer.record(source)
+                stage_start = time.perf_counter()
+                try:
+                    with sr.AudioFile(audio_data_file) as source:
+                        audio_data = self.__recognizer.record(source)
 
-                transcript = self.__recognizer.recognize_google(audio_data, language = self.in_lang) #, show_all = True)
+                    transcript = self.__recognizer.recognize_google(audio_data, language = self.in_lang) #, show_all = True)
+                finally:
+                    self.__record_stage('recognize', stage_start)
 
                 # Translate the transcript using googletrans
+                stage_start = time.perf_counter()
                 translated_text = self.__translator.translate(text=transcript, dest=self.out_lang)
+                self.__record_stage('translate', stage_start)
 
                 return (transcript, translated_text.text)
 
@@ -158,6 +352,11 @@ class SubtitleGenerator:
             except Exception as e:
                 print(f"Retrying on unexpected exception: {e}", file=stderr)
 
+    def __record_stage( self, stage=str, start=float )->None:
+        # accumulate time spent in a pipeline stage since start (time.perf_counter)
+        with self.__stage_lock:
+            self.stage_times[stage] = self.stage_times.get(stage, 0.0) + time.perf_counter() - start
+
     def __write_to_file( self, subtitle_lines=list )->None:
             # expected struct
             # [
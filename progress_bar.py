@@ -1,10 +1,9 @@
 import contextlib
-import joblib
-from tqdm import tqdm
 
 @contextlib.contextmanager
 def tqdm_joblib_progress_bar(tqdm_object):
     """Context manager to patch joblib to report into tqdm progress bar given as argument"""
+    import joblib.parallel
     class TqdmBatchCompletionCallback(joblib.parallel.BatchCompletionCallBack):
         def __call__(self, *args, **kwargs):
             tqdm_object.update(n=self.batch_size)